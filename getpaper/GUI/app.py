@@ -6,6 +6,7 @@ from ttkbootstrap import Style
 from getpaper.GUI.main_frame import MainFrame
 from getpaper.GUI.menu import MenuBar
 from getpaper.GUI.result_frame import ResultFrame
+from getpaper.cache import clearCache
 from getpaper.config import APP_NAME, FONT, FRAME_STYLE
 
 log = logging.getLogger("GetPaper")
@@ -36,3 +37,6 @@ class Application(Style):
     def run(self) -> None:
         """Run the App"""
         self.master.mainloop()
+        clearCache()
+        if getattr(self.main_frame, "spider", None) is not None:
+            self.main_frame.spider.close()
@@ -1,12 +1,14 @@
 import logging
 import time
 import tkinter as tk
-from queue import PriorityQueue, Queue
+from functools import partial
+from queue import Empty, Queue
 from tkinter.ttk import Button, Combobox, Entry, Frame, Label, Progressbar, Spinbox
-from typing import List
+from typing import Any, Callable, List, Sequence
 
+from getpaper.cache import saveCache
 from getpaper.config import (DEFAULT_SCI_HUB_URL, SORTED_BY, TIMEOUT, TIP_REFRESH, spider_list)
-from getpaper.utils import MyThread, TipException, getQueueData, setSpider, startThread
+from getpaper.utils import MyThread, setSpider, startThread
 from getpaper.spiders._spider import _Spider
 
 log = logging.getLogger("GetPaper")
@@ -131,7 +133,6 @@ class MainFrame(Frame):
             self.search_button.state(["!disabled"])
 
     # @setSpider
-    @startThread("FetchDetail")
     def getDetail(self) -> None:
         """
         Download paper details, include:
@@ -140,62 +141,95 @@ class MainFrame(Frame):
 
         self.download_button.state(["disabled"])
         self.tip.setTip("准备中...")
-        result = PriorityQueue()
         try:
             num = int(self.num.get())
             if num < 1:
                 self.tip.setTip("文献数不为正整数")
+                self.download_button.state(["!disabled"])
                 return
-            # create a Queue to store result
+            # create a Queue to monitor progress, results are stored in spider.results
             log.info(f"Fetch num: {num}")
-            result.maxsize = num
+            progress = Queue(num)
+            # a new search may replace self.spider while fetching, keep the fetching one
+            spider = self.spider
             # Start task on new thread 
             # tip_set function for catching TipException show on GUI
             MyThread(tip_set=self.tip.setTip,
-                     target=self.spider.getAllPapers,
-                     args=(result, num),
+                     target=spider.getAllPapers,
+                     args=(progress, num),
                      name=f"{self.engine.get()} Fetch"
                      ).start()
 
-            self.monitor(result, num)
+            self.monitor(progress, num, partial(self.showResult, spider))
         except Exception as e:
             log.error(e)
-        else:
-            self.tip.setTip("获取结束")
-        finally:
-            size = 0
-            self.tip.bar.stop()
-            try:
-                if not result.empty():
-                    size = result.qsize()
-                    self.result = getQueueData(result)
-                    # get item from queue and send all to result frame
-                    self.result_frame.createForm(self.result)  # type: ignore
-            finally:
-                self.download_button.state(["!disabled"])
-                self.tip.setTip(f"抓取完成， 共{size}篇")
+            self.download_button.state(["!disabled"])
+
+    def showResult(self, spider: _Spider) -> None:
+        """
+        Send fetched details to result frame after fetching finished
+        Args:
+            spider: The spider that fetched the details
+        """
+
+        self.tip.bar.stop()
+        # results are in order of search result, skip the papers not fetched
+        if (result := [detail for detail in getattr(spider, "results", []) if detail is not None]):
+            self.result = result
+            self.result_frame.createForm(self.result)  # type: ignore
+            self.saveCache(self.result)
+        self.download_button.state(["!disabled"])
+        self.tip.setTip(f"抓取完成， 共{len(result)}篇")
+
+    @startThread("Save_Cache")
+    def saveCache(self, result: List[Sequence[str]]) -> None:
+        """
+        Save search result to cache file in background, repeated json lines exports copy it
+        Args:
+            result: Search result
+        """
+
+        try:
+            saveCache(result)
+        except Exception as e:
+            log.error(f"Save cache failed: {e}")
 
-    def monitor(self, monitor_queue: Queue, total: int) -> None:
+    def monitor(self, monitor_queue: Queue, total: int, callback: Callable[[], Any]) -> None:
         """
-        Monitor progress by the size of Queue, progress = queue.qsize / total
+        Monitor progress without blocking, the Queue is drained on GUI thread every TIP_REFRESH second
+        and the tip bar is updated once for each drain, progress = number of drained items / total
         Args:
-            monitor_queue: Queue to monitor.
-            total: the max size of the Queue
+            monitor_queue: Queue to monitor, an item is put for each finished task.
+            total: the number of tasks, replaced by monitor_queue.maxsize if it was set
+            callback: called when all tasks finished or timeout
         """
 
-        # start progress bar
         start = time.time()
-        size = 0
-        while True:
-            current_size = monitor_queue.qsize()
-            if current_size == size:
+        count = 0
+
+        def drain() -> None:
+            nonlocal start, count
+            size = count
+            try:
+                while True:
+                    monitor_queue.get_nowait()
+                    count += 1
+            except Empty:
+                pass
+            # maxsize could be modified by task, e.g. spider found nothing
+            target = monitor_queue.maxsize or total
+            if count >= target:
+                callback()
+                return
+            if count == size:
                 if time.time() - start > TIMEOUT:
-                    raise TipException("连接超时")
-            elif monitor_queue.full():
-                break
+                    log.info("Monitor time out")
+                    callback()
+                    return
             else:
                 start = time.time()
-                size = current_size
-                self.tip.setTip(f"下载中：{current_size}/{total}")
-                self.tip.bar["value"] = 100 * current_size / total
-            time.sleep(TIP_REFRESH)
+                self.tip.setTip(f"下载中：{count}/{target}")
+                self.tip.bar["value"] = 100 * count / target
+            self.after(int(TIP_REFRESH * 1000), drain)
+
+        self.after(int(TIP_REFRESH * 1000), drain)
@@ -1,4 +1,5 @@
 import csv
+import io
 import logging
 import os
 import tkinter as tk
@@ -8,9 +9,10 @@ from tkinter.filedialog import askdirectory, askopenfile, asksaveasfilename
 from typing import List
 
 from getpaper.GUI.main_frame import MainFrame
-from getpaper.config import PROJECT_URL, RESULT_LIST_EN
+from getpaper.cache import copyCache, dumpResult
+from getpaper.config import PROJECT_URL, RESULT_HEADER, WRITE_BUFFER
 from getpaper.download import SciHubDownloader
-from getpaper.utils import MyThread, startThread
+from getpaper.utils import startThread, submitAsync
 
 log = logging.getLogger("GetPaper")
 
@@ -32,12 +34,9 @@ class MenuBar(tk.Menu):
         self.add_command(label="通过DOI下载", command=self.downloadByDoiFile)
         self.add_command(label="使用说明", command=self.help)
 
-    @startThread("Save_File")
     def saveToFile(self) -> None:
         """
-        Save search result to csv file
-        Args:
-            filename: Name of csv file to save
+        Save search result to csv file, or json lines file (one json object per line)
         """
 
         if not hasattr(self.main_frame, "result"):
@@ -45,20 +44,40 @@ class MenuBar(tk.Menu):
             self.tip.setTip("无搜索结果")
             return
 
-        if filename := asksaveasfilename(defaultextension=".csv", filetypes=[("csv", ".csv")]):
-            filename = os.path.abspath(filename)
-            log.info(f"Save file to file: {filename}")
-            try:
-                with open(filename, "w", newline="", encoding="utf-8") as f:
-                    writer = csv.writer(f)
-                    writer.writerow([s.strip(":\n") for s in RESULT_LIST_EN])
-                    writer.writerows(self.main_frame.result)
-                self.tip.setTip("保存成功")
-            except Exception as e:
-                log.error(f"Save {filename} failed: ", e)
-                self.tip.setTip("保存失败")
+        # Ask filename on GUI thread, then write file on a new thread
+        if filename := asksaveasfilename(defaultextension=".csv",
+                                         filetypes=[("csv", ".csv"), ("json lines", ".jsonl")]):
+            self.writeFile(os.path.abspath(filename))
+
+    @startThread("Save_File")
+    def writeFile(self, filename: str) -> None:
+        """
+        Write search result to file, format depends on the suffix of filename
+        Args:
+            filename: Name of file to save
+        """
+
+        log.info(f"Save file to file: {filename}")
+        try:
+            # json lines cache has the same format, copy it instead of serializing again
+            if filename.endswith(".jsonl") and copyCache(self.main_frame.result, filename):
+                log.info("Copy search result from cache")
+            else:
+                # write through a large buffer to avoid a syscall for every row
+                with open(filename, "wb", buffering=WRITE_BUFFER) as raw, \
+                        io.TextIOWrapper(raw, encoding="utf-8", newline="", write_through=False) as f:
+                    if filename.endswith(".jsonl"):
+                        dumpResult(self.main_frame.result, f)
+                    else:
+                        writer = csv.writer(f)
+                        writer.writerow(RESULT_HEADER)
+                        writer.writerows(self.main_frame.result)
+            # update tip on GUI thread
+            self.main_frame.after(0, self.tip.setTip, "保存成功")
+        except Exception as e:
+            log.error(f"Save {filename} failed: {e}")
+            self.main_frame.after(0, self.tip.setTip, "保存失败")
 
-    @startThread("DownloadPapers")
     def downloadAll(self, details: List[List[str]] = []) -> None:
         """
         Using SciHubDownloader to get PDFs of all results to specified directory
@@ -84,16 +103,21 @@ class MenuBar(tk.Menu):
                 # create a queue for monitor progress of download
                 monitor_queue = Queue(maxsize=len(details))
                 downloader = SciHubDownloader(self.main_frame.scihub_url.get())
-                MyThread(tip_set=self.tip.setTip,
-                         target=downloader.multiDownload,
-                         args=(details, monitor_queue, target_dir),
-                         name="Multi-Download").start()
+                # download on the background event loop
+                # exceptions are reported on the event loop thread, show them on GUI thread
+                submitAsync(downloader.multiDownloadAsync(details, monitor_queue, target_dir),
+                            lambda tip: self.main_frame.after(0, self.tip.setTip, tip))
+
+                self.main_frame.monitor(monitor_queue, len(details), self.downloadFinished)
+            except Exception as e:
+                log.error(e)
+                self.downloadFinished()
 
-                self.main_frame.monitor(monitor_queue, len(details))
+    def downloadFinished(self) -> None:
+        """Reset tip bar after all downloads finished"""
 
-            finally:
-                self.tip.setTip("下载结束")
-                self.tip.bar.stop()
+        self.tip.setTip("下载结束")
+        self.tip.bar.stop()
 
     def downloadByDoiFile(self) -> None:
         """
@@ -104,18 +128,14 @@ class MenuBar(tk.Menu):
         """
 
         if file := askopenfile(filetypes=[("文本文件", ".txt")]):
-            dois = file.readlines()
-            details = []
-            log.info(f"Open file: {file.name}\nNumber of lines:{len(dois)}")
-
-            for doi in dois:
-                if not doi:
-                    continue
-                if not doi.startswith("10."):
-                    # all valid doi start with "10."
-                    continue
+            log.info(f"Open file: {file.name}")
+            with file:
+                # read lines lazily, all valid doi start with "10.", skip the repeated doi
                 # create a detail list, detail[0] = title(as filename), detail[-2] = doi
-                details.append([doi.strip(), None, doi.strip(), None])
+                seen = set()
+                details = [[doi, None, doi, None]
+                           for doi in (line.strip() for line in file)
+                           if doi.startswith("10.") and not (doi in seen or seen.add(doi))]
 
             log.info(f"Number of loaded doi: {len(details)}")
             self.downloadAll(details)
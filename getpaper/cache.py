@@ -0,0 +1,68 @@
+import json
+import logging
+import shutil
+from threading import Lock
+from typing import IO, Iterable, Optional, Sequence
+
+from getpaper.config import CACHE_FILE, RESULT_HEADER, WRITE_BUFFER
+
+log = logging.getLogger("GetPaper")
+
+_lock = Lock()
+_cached: Optional[Sequence[Sequence[str]]] = None  # the result saved in CACHE_FILE
+
+
+def dumpResult(result: Iterable[Sequence[str]], f: IO[str]) -> None:
+    """
+    Write search result to a text file as json lines, one json object for each paper
+    Args:
+        result: Search result, each item is (title, authors, date, publication, abstract, doi, web)
+        f: Text file opened for writing
+    """
+
+    f.writelines(json.dumps(dict(zip(RESULT_HEADER, row)), ensure_ascii=False) + "\n"
+                 for row in result)
+
+
+def saveCache(result: Sequence[Sequence[str]]) -> None:
+    """
+    Save search result to cache file
+    Args:
+        result: Search result
+    """
+
+    global _cached
+    with _lock:
+        _cached = None
+        CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(CACHE_FILE, "w", encoding="utf-8", newline="", buffering=WRITE_BUFFER) as f:
+            dumpResult(result, f)
+        _cached = result
+    log.info(f"Save cache to file: {CACHE_FILE}")
+
+
+def copyCache(result: Sequence[Sequence[str]], filename: str) -> bool:
+    """
+    Copy cache file to filename if the cache was saved from result
+    Args:
+        result: Search result to export
+        filename: Name of file to save
+    Returns:
+        returns: Whether the cache was copied
+    """
+
+    with _lock:
+        if _cached is None or _cached is not result:
+            return False
+        with open(CACHE_FILE, "rb") as src, open(filename, "wb") as dst:
+            shutil.copyfileobj(src, dst, WRITE_BUFFER)
+    return True
+
+
+def clearCache() -> None:
+    """Remove the cache file"""
+
+    global _cached
+    with _lock:
+        _cached = None
+        CACHE_FILE.unlink(missing_ok=True)
@@ -1,4 +1,6 @@
+import os
 import sys
+import tempfile
 from pathlib import Path
 
 if hasattr(sys, "frozen"):
@@ -21,11 +23,17 @@ HEADER = {"user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/5
                         "Chrome/80.0.3987.132 Safari/537.36"}
 
 CLIENT_TIMEOUT = 10 # Global AsyncClient timeout
+CONNECT_LIMIT = 20  # max number of connections kept by a session
+KEEPALIVE_TIMEOUT = 30  # seconds to keep an idle connection for reuse
+FETCH_LIMIT = 3     # max number of concurrent requests to PubMed, efetch is also limited to FETCH_LIMIT requests/s
 TIMEOUT = 15        # Tip timeout
 TIP_REFRESH = 0.2   # MainFrame's tip bar refresh frequency
 SCI_DELAY = 0.1     # add delay avoid putting too much pressure on the Sci_Hub server
+SCI_LIMIT = 4       # max number of concurrent downloads from Sci_Hub
+WRITE_BUFFER = 1 << 20  # buffer size of exported file
 
 APP_NAME = "GetPaper"
+CACHE_FILE = Path(tempfile.gettempdir()) / APP_NAME / f"result.{os.getpid()}.cache.jsonl"
 DEFAULT_SCI_HUB_URL = "sci-hub.ren"
 FRAME_STYLE = {"relief": "ridge", "padding": 10}
 FONT = ("微软雅黑", 12)
@@ -34,5 +42,7 @@ SORTED_BY = ("相关性", "日期", "日期逆序")
 # For Detail_Frame to show result detail
 RESULT_LIST_EN = ["Title:\n", "Authors:\n", "Date:\t", "Publication:\t", "Abstract:\n", "doi:\t", "Url:\t"]
 RESULT_LIST_CN = ["标题:\n", "作者:\n", "日期:\t", "期刊:\t", "摘要:\n", "doi:\t", "网址:\t"]
+# Header of exported file
+RESULT_HEADER = tuple(s.strip(":\n\t") for s in RESULT_LIST_EN)
 
 PROJECT_URL = "https://gitee.com/Dragon-GCS/GetPaper"
\ No newline at end of file
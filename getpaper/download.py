@@ -7,12 +7,15 @@ from typing import Any, Optional
 from typing import Protocol, Sequence
 
 import aiohttp
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 
-from getpaper.config import SCI_DELAY
+from getpaper.config import SCI_DELAY, SCI_LIMIT
 from getpaper.utils import AsyncFunc, getSession
 
 log = logging.getLogger("GetPaper")
+_INVALID_CHAR = re.compile(r"[:?/*|<>\"\\]")
+# Only parse the iframe that contains pdf url
+_PDF_STRAINER = SoupStrainer("iframe", id = "pdf")
 
 def checkFilename(filename: str, suffix: str = ".pdf"):
     """
@@ -24,12 +27,23 @@ def checkFilename(filename: str, suffix: str = ".pdf"):
     Returns:
         returns: filename without invalid character and ends with specified suffix
     """
-    valid_name = re.sub(r"[:?/*|<>\"\\]", "", filename).rstrip(".")
+    valid_name = _INVALID_CHAR.sub("", filename).rstrip(".")
     if not valid_name.endswith(suffix):
         valid_name += suffix
     return valid_name
 
 
+def saveFile(filename: str, content: bytes) -> None:
+    """
+    Write content to file
+    Args:
+        filename: path of file
+        content: bytes to write
+    """
+    with open(filename, "wb") as f:
+        f.write(content)
+
+
 class Downloader(Protocol):
     def download(self, doi: str, filename: str = "") -> Any:
         ...
@@ -37,23 +51,26 @@ class Downloader(Protocol):
     def multiDownload(self, details: Sequence[Sequence[str]], monitor: Queue, target_dir: str = "") -> Any:
         ...
 
+    async def multiDownloadAsync(self, details: Sequence[Sequence[str]], monitor: Queue, target_dir: str = "") -> Any:
+        ...
+
 
 class SciHubDownloader:
     monitor: Queue
     session: aiohttp.ClientSession
+    semaphore: asyncio.Semaphore
 
     def __init__(self, url: str) -> None:
         if not url.startswith("https"):
             url = "https://" + url
         self.url = url
 
-    async def _download(self, doi: str, filename: str, index: int = 0) -> None:
+    async def _download(self, doi: str, filename: str) -> None:
         """
         From Sci-Hub download pdf by doi.
         Args:
             doi: the doi of paper, from search result.
             filename: name of downloaded pdf file.
-            index: index of doi, download will be delayed by index * SCI_DELAY second.
         """
 
         url = f"{self.url}/{doi}"
@@ -62,22 +79,23 @@ class SciHubDownloader:
         base, filename = os.path.split(filename)
         error_name = filename
 
-        log.debug(f"Downloading doi: {doi}")
-        await asyncio.sleep(index * SCI_DELAY)  # add delay
-
         if doi:
             for _ in range(3):
                 # try 3 times for download
                 try:
-                    async with self.session.get(url) as response:
-                        bs = BeautifulSoup(await response.text(), "lxml")
-                        if pdf := bs.find("iframe", id = "pdf"):
-                            async with self.session.get(pdf["src"].split("#")[0]) as result:
-                                content = await result.read()
-                                flag = True
-                        else:
-                            content = f"Sci-Hub has not yet included this paper\ndoi: {doi}".encode("utf-8")
-                        break
+                    # Limit the number of concurrent downloads
+                    async with self.semaphore:
+                        log.debug(f"Downloading doi: {doi}")
+                        async with self.session.get(url) as response:
+                            bs = BeautifulSoup(await response.text(), "lxml", parse_only = _PDF_STRAINER)
+                            if pdf := bs.find("iframe", id = "pdf"):
+                                async with self.session.get(pdf["src"].split("#")[0]) as result:
+                                    content = await result.read()
+                                    flag = True
+                            else:
+                                content = f"Sci-Hub has not yet included this paper\ndoi: {doi}".encode("utf-8")
+                        await asyncio.sleep(SCI_DELAY)  # add delay
+                    break
 
                 except asyncio.exceptions.TimeoutError:
                     content = f"Connect timeout\n{filename}\nURL: {url}".encode("utf-8")
@@ -101,11 +119,18 @@ class SciHubDownloader:
             # use error name to save file
             filename = error_name.replace(".pdf", ".txt")
 
-        with open(os.path.join(base, filename), "wb") as f:
-            f.write(content)
-
-        if getattr(self, "monitor", None) is not None:
-            self.monitor.put((filename, flag))
+        try:
+            # Write file on another thread, the next download needn't wait for disk
+            await asyncio.get_running_loop().run_in_executor(
+                None, saveFile, os.path.join(base, filename), content)
+        except OSError as e:
+            log.error(f"Save {filename} failed: {e}")
+            flag = False
+            raise
+        finally:
+            # report progress even if saving failed
+            if getattr(self, "monitor", None) is not None:
+                self.monitor.put((filename, flag))
 
         log.debug(f"Download finish: {filename}")
 
@@ -120,13 +145,16 @@ class SciHubDownloader:
 
         if getattr(self, "session", None) is None:
             self.session = getSession()
+        self.semaphore = asyncio.Semaphore(1)
 
-        await self._download(doi, filename)
-        if hasattr(self, "session"):
-            try:
-                await self.session.close()
-            finally:
-                del self.session
+        try:
+            await self._download(doi, filename)
+        finally:
+            if hasattr(self, "session"):
+                try:
+                    await self.session.close()
+                finally:
+                    del self.session
 
     @AsyncFunc
     async def multiDownload(self,
@@ -135,7 +163,19 @@ class SciHubDownloader:
                             target_dir: str = ""
                             ) -> None:
         """
+        Same as multiDownloadAsync, but block until all downloads finish.
+        """
+
+        await self.multiDownloadAsync(details, monitor, target_dir)
+
+    async def multiDownloadAsync(self,
+                                 details: Sequence[Sequence[str]],
+                                 monitor: Queue,
+                                 target_dir: str = ""
+                                 ) -> None:
+        """
         Download multiple paper from sci-hub by doi, filename defaults to title.
+        At most SCI_LIMIT papers are downloaded at the same time.
         Args:
             details: A sequences include all search result, title is details[0], doi is details[-2]
             monitor：A Queue for monitoring the download progress by monitor.qsize() / monitor.max_size
@@ -144,24 +184,29 @@ class SciHubDownloader:
         self.monitor = monitor
 
         if getattr(self, "session", None) is None:
-            self.session = getSession()
+            self.session = getSession(limit = SCI_LIMIT)
+        self.semaphore = asyncio.Semaphore(SCI_LIMIT)
 
         if not os.path.isdir(target_dir):
             os.makedirs(target_dir)
 
         task = []
-        for index, (title, *_, doi, __) in enumerate(details) :
+        for title, *_, doi, __ in details:
             valid_name = checkFilename(title)
             filename = os.path.join(target_dir, valid_name)
-            task.append(self._download(doi, filename, index = index))
-
-        await asyncio.gather(*task)
-
-        if hasattr(self, "session"):
-            try:
-                await self.session.close()
-            finally:
-                del self.session
+            task.append(self._download(doi, filename))
+
+        try:
+            # A failed download should not stop the others
+            for error in await asyncio.gather(*task, return_exceptions = True):
+                if isinstance(error, Exception):
+                    log.error(f"Sci-Hub Download Error: {error}")
+        finally:
+            if hasattr(self, "session"):
+                try:
+                    await self.session.close()
+                finally:
+                    del self.session
 
 
 if __name__ == "__main__":
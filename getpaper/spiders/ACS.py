@@ -1,16 +1,17 @@
 import asyncio
 import logging
 import re
-from queue import PriorityQueue
+from queue import Queue
 from typing import Any, Dict
 
 from bs4 import BeautifulSoup
 
-from getpaper.spiders._spider import _Spider
-from getpaper.utils import AsyncFunc, TipException, getSession
+from getpaper.spiders._spider import _Spider, spiderJob
+from getpaper.utils import AsyncFunc, TipException
 
 GET_FREQUENCY = 0.05    # frequency to fetch paper
 log = logging.getLogger("GetPaper")
+_SPACE = re.compile(r"\s+")
 
 class Spider(_Spider):
     base_url = "https://pubs.acs.org/action/doSearch"
@@ -41,14 +42,13 @@ class Spider(_Spider):
         return data
 
     @AsyncFunc
+    @spiderJob
     async def getTotalPaperNum(self):
-        self.data["startPage"] = 0
-        self.data["pageSize"] = 20
+        params = {**self.data, "startPage": 0, "pageSize": 20}
         try:
-            async with getSession() as session:
-                async with session.get(self.base_url, params = self.data) as response:
-                    log.info(f"Get URL: {response.url}\nURL Status: {response.status}")
-                    html = await response.text()
+            async with self.session.get(self.base_url, params = params) as response:
+                log.info(f"Get URL: {response.url}\nURL Status: {response.status}")
+                html = await response.text()
         except asyncio.exceptions.TimeoutError:
             log.info("ACS Spider Get Total Num Time Out")
             raise TipException("连接超时")
@@ -78,7 +78,7 @@ class Spider(_Spider):
         except Exception as e:
             log.error(f"ACS Spider Error: {e}")
             for index in range(page * 100, min((page + 1) * 100, num)):
-                self.result_queue.put((index, ["Error"] * 6))
+                self.setResult(index, ["Error"] * 6)
         else:
             bs = BeautifulSoup(html, "lxml")
             contents = iter(bs.find_all(class_ = "issue-item_metadata"))
@@ -86,7 +86,7 @@ class Spider(_Spider):
                 try:
                     content = (next(contents))
                 except StopIteration:
-                    self.result_queue.put((index, [""] * 6))
+                    self.setResult(index, [""] * 6)
                     continue
                 # Find titles、doi、web_url
                 title_tag = content.find("h2", class_ = "issue-item_title")
@@ -109,37 +109,27 @@ class Spider(_Spider):
                 # find publications
                 # Chapter and article have different format
                 if content.parent.find(class_ = "infoType").string == "Chapter":
-                    publication = re.sub(r"\s+", " ", content.find(class_ ="issue-item_chapter").text)
+                    publication = _SPACE.sub(" ", content.find(class_ ="issue-item_chapter").text)
                 else:
                     publication = tag.text \
                                 if (tag := content.find(class_ = "issue-item_jour-name")) \
                                 else "No Publication"
-                # Save data to result queue
-                self.result_queue.put((index,
-                                    (title, authors, date, publication, abstract, doi, web)))
+                # Save data to results
+                self.setResult(index, (title, authors, date, publication, abstract, doi, web))
 
     @AsyncFunc
-    async def getAllPapers(self, result_queue: PriorityQueue, num: int) -> None:
-        self.result_queue = result_queue
+    @spiderJob
+    async def getAllPapers(self, progress: Queue, num: int) -> None:
         num = max(1, num)
-        self.data["pageSize"] = 100
-
-        if getattr(self, "session", None) is None:
-            self.session = getSession()
-
+        self.progress = progress
+        self.results = [None] * num
         tasks = []
         for page in range((num - 1) // 100 + 1):
-            self.data["startPage"] = page
-            tasks.append(self.getPagesInfo(self.data.copy(), num))
+            params = {**self.data, "startPage": page, "pageSize": 100}
+            tasks.append(self.getPagesInfo(params, num))
 
         await asyncio.gather(*tasks)
 
-        if hasattr(self, "session"):
-            try:
-                await self.session.close()
-            finally:
-                del self.session
-
 
 if __name__ == "__main__":
     acs = Spider(keyword = "human",
@@ -150,7 +140,5 @@ if __name__ == "__main__":
                 sorting = "日期逆序"
                 )
     print(acs.getTotalPaperNum())
-    q = PriorityQueue(4)
-    acs.getAllPapers(q, 4)
-    for i in range(4):
-        print(q.get())
+    acs.getAllPapers(Queue(4), 4)
+    print(acs.results)
@@ -1,21 +1,65 @@
 import asyncio
 import logging
 import re
-from queue import PriorityQueue
-from typing import Any, Dict, Sequence
+from queue import Queue
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
-from bs4 import BeautifulSoup
+import lxml.html
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
 
-from getpaper.spiders._spider import _Spider
-from getpaper.utils import AsyncFunc, TipException, getSession
+from getpaper.config import FETCH_LIMIT
+from getpaper.spiders._spider import _Spider, spiderJob
+from getpaper.utils import AsyncFunc, TipException
 
-GET_FREQUENCY = 0.1  # frequency to fetch paper
+EFETCH_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
+EFETCH_SIZE = 200   # number of PMIDs fetched by one efetch request
+PAGE_SIZE = 200     # number of PMIDs on a page of search result
+EFETCH_RETRY = 3    # times to try an efetch request rejected by rate limit or server error
+RETRY_DELAY = 1     # seconds to wait before retry, increased for each retry
 log = logging.getLogger("GetPaper")
+# Nodes of <PubmedArticle> and <PubmedBookArticle> used by paper's detail
+_ARTICLE_FIELDS = etree.XPath(
+    "MedlineCitation/PMID"
+    " | MedlineCitation/Article/ArticleTitle"
+    " | MedlineCitation/Article/AuthorList/Author"
+    " | MedlineCitation/Article/Journal/Title"
+    " | MedlineCitation/Article/Journal/ISOAbbreviation"
+    " | MedlineCitation/Article/Journal/JournalIssue/Volume"
+    " | MedlineCitation/Article/Journal/JournalIssue/Issue"
+    " | MedlineCitation/Article/Journal/JournalIssue/PubDate"
+    " | MedlineCitation/Article/Pagination/MedlinePgn"
+    " | MedlineCitation/Article/Abstract/AbstractText"
+    " | MedlineCitation/Article/ELocationID[@EIdType='doi']"
+    " | PubmedData/ArticleIdList/ArticleId[@IdType='doi']"
+    " | BookDocument/PMID"
+    " | BookDocument/ArticleTitle"
+    " | BookDocument/AuthorList/Author"
+    " | BookDocument/Abstract/AbstractText"
+    " | BookDocument/ArticleIdList/ArticleId[@IdType='doi']"
+    " | BookDocument/Book/BookTitle"
+    " | BookDocument/Book/Publisher/PublisherName"
+    " | BookDocument/Book/PubDate")
+# Records of efetch result, books and chapters are <PubmedBookArticle>
+_ARTICLES = etree.XPath("PubmedArticle | PubmedBookArticle")
+# Get the number of result and the PMID of single result page without parsing the whole page
+_COUNT_RE = re.compile(rb'results-amount"(?:(?!</div>)[\s\S])*?<span[^>]*>\s*([\d,]+)')
+_CURRENT_ID_RE = re.compile(rb'class="current-id"[^>]*>\s*(\d+)')
+_PMID_PRE_RE = re.compile(rb'<pre class="search-results-chunk"[^>]*>([\s\S]*?)</pre>')
+# Only parse the tag that contains PMIDs if regex missed
+_PMID_STRAINER = SoupStrainer("pre", class_="search-results-chunk")
+
+
+def _text(tag: etree._Element) -> str:
+    """Get all text in the tag, include text of inline tags such as <i>"""
+
+    return "".join(tag.itertext()).strip()
 
 
 class Spider(_Spider):
     base_url = "https://pubmed.ncbi.nlm.nih.gov/"
     single_page_pmid: str
+    semaphore: asyncio.Semaphore
 
     def parseData(self, keyword: str,
                   start_year: str = "",
@@ -47,143 +91,234 @@ class Spider(_Spider):
         return data
 
     @AsyncFunc
+    @spiderJob
     async def getTotalPaperNum(self):
-        self.data["format"] = "summary"
+        params = {**self.data, "format": "summary"}
         try:
-            async with getSession() as session:
-                async with session.get(self.base_url, params=self.data) as response:
-                    log.info(
-                        f"Get URL: {response.url}\nURL Status: {response.status}")
-                    html = await response.text()
+            async with self.session.get(self.base_url, params=params) as response:
+                log.info(
+                    f"Get URL: {response.url}\nURL Status: {response.status}")
+                html = await response.read()
         except asyncio.exceptions.TimeoutError:
             log.info("PubMed Spider Get Total Num Time Out")
             raise TipException("连接超时")
         else:
-            bs = BeautifulSoup(html, "lxml")
-            if bs.find("span", class_="single-result-redirect-message"):
+            # Parse the page by lxml only if regex missed
+            if b"single-result-redirect-message" in html:
                 self.total_num = 1
-                if (pmid := bs.find("strong", class_ = "current-id")):
-                    self.single_page_pmid = pmid.text
+                if (match := _CURRENT_ID_RE.search(html)):
+                    self.single_page_pmid = match.group(1).decode()
+                elif (tag := lxml.html.fromstring(html).find_class("current-id")):
+                    self.single_page_pmid = tag[0].text_content().strip()
                 else:
                     self.single_page_pmid = ""
-            elif (tag := bs.find("div", class_="results-amount")):
-                self.total_num = int(tag.span.text.replace(",", ""))  # type: ignore
+            elif (match := _COUNT_RE.search(html)):
+                self.total_num = int(match.group(1).replace(b",", b""))
+            elif html and (tag := lxml.html.fromstring(html).xpath('//div[contains(concat(" ", @class, " "), " results-amount ")]/descendant::span[1]')) \
+                    and (count := tag[0].text_content().strip().replace(",", "")).isdigit():
+                self.total_num = int(count)
             else:
                 self.total_num = 0
             return f"共找到{self.total_num}篇"
 
+    async def getPMIDPage(self, page: int) -> Optional[List[str]]:
+        """
+        Get the PMIDs on a page of search result
+        Args:
+            page: Page number, start from 1
+        Returns:
+            returns: PMIDs on the page, None if no PMID was found
+        """
+        # Use a new params for each page, pages are fetched at the same time
+        params = {**self.data, "size": PAGE_SIZE, "page": page, "format": "pmid"}
+        async with self.semaphore:
+            async with self.session.get(self.base_url, params=params) as response:
+                log.info(
+                    f"Get URL: {response.url}\nURL Status: {response.status}")
+                html = await response.read()
+
+        # PMIDs in <pre> are separated by whitespace
+        if (match := _PMID_PRE_RE.search(html)):
+            return match.group(1).decode("ascii").split()
+        bs = BeautifulSoup(html, "lxml", parse_only=_PMID_STRAINER)
+        if not (tag := bs.find("pre", class_="search-results-chunk")):
+            return None
+        return tag.text.split()
+
     async def getPMIDs(self, num: int) -> Sequence[str]:
         """
         Get the paper's PMIDs
         Args:
             num: Number of PMIDs to fetch
         """
-        pmid_list = []
-        self.data.update({"size": "200",
-                          "page": 1,
-                          "format": "pmid"})
-        # Get page by order and fetch PMIDs
-        try:
-            while self.data["page"] <= (num - 1) // 200 + 1:
-                async with self.session.get(self.base_url, params=self.data.copy()) as response:
-                    log.info(
-                        f"Get URL: {response.url}\nURL Status: {response.status}")
-                    html = await response.text()
-
-                bs = BeautifulSoup(html, "lxml")
-                # If no pmid was find, modify result.max_size to 1 for stop monitoring.
-                if not (tag := bs.find("pre", class_="search-results-chunk")):
-                    self.result_queue.maxsize = 1
-                    self.result_queue.put((0, ["Not found any papers"] * 7))
-                    raise TipException("未找到相关文献")
-
-                result = tag.text.split()
-                pmid_list.extend(result)
-                # Stop if find only one pmid
-                if len(result) == 1:
-                    break
+        pmid_list: List[str] = []
+        # Number of pages is known, fetch all pages at the same time
+        # Don't request pages beyond the total number of search result
+        if getattr(self, "total_num", 0) > 0:
+            num = min(num, self.total_num)
+        pages = (num - 1) // PAGE_SIZE + 1
+        results = await asyncio.gather(*[self.getPMIDPage(page) for page in range(1, pages + 1)],
+                                       return_exceptions=True)
 
-                self.data["page"] += 1
-        except asyncio.exceptions.TimeoutError:
-            log.info("PubMed Fetch PMIDs Time Out")
-            raise TipException("连接超时")
-        except Exception as e:
-            log.error(
-                f"PubMed Error in fetching PMIDs[{self.data['page']} / { num // 200 + 1}]: {e}")
-        finally:
-            return pmid_list[:num]
+        # If no pmid was find, modify progress.max_size to 1 for stop monitoring.
+        if results[0] is None:
+            self.progress.maxsize = 1
+            self.results = [None]
+            self.setResult(0, ["Not found any papers"] * 7)
+            raise TipException("未找到相关文献")
 
-    async def getPagesInfo(self, index: int, pmid: str):
-        title = "No Title"
-        authors = "No Author"
-        doi = "No DOI"
-        publication = "No Publication"
-        abstract = "No Abstract"
-        date = "No Date"
-        web = self.base_url + pmid
+        # Keep PMIDs in order, stop at the first page failed
+        for page, result in enumerate(results, 1):
+            if isinstance(result, asyncio.exceptions.TimeoutError):
+                log.info(f"PubMed Fetch PMIDs[{page} / {pages}] Time Out")
+                break
+            if isinstance(result, Exception):
+                log.error(f"PubMed Error in fetching PMIDs[{page} / {pages}]: {result}")
+                break
+            if not result:
+                break
+            pmid_list.extend(result)
+            # Stop if find only one pmid
+            if len(result) == 1:
+                break
 
-        # Decrease access frequency
-        await asyncio.sleep(index * GET_FREQUENCY)
-        log.debug(f"Fetching PMID[{pmid}]")
+        return pmid_list[:num]
 
-        try:
-            async with self.session.get(web) as html:
-                bs = BeautifulSoup(await html.text(), "lxml")
-        except Exception as e:
-            log.error(f"PMID[{pmid}] Spider Error: {e}")
-            title, authors, date, publication, abstract, doi = ["Error"] * 6
-        else:
-            content = bs.find("main", class_="article-details")
-            if not content:
-                return
+    def parseArticle(self, article: etree._Element) -> Tuple[str, ...]:
+        """
+        Extract paper's detail from a <PubmedArticle> or <PubmedBookArticle> node of efetch result
+        Args:
+            article: PubmedArticle or PubmedBookArticle node
+        Returns:
+            returns: (title, authors, date, publication, abstract, doi, web)
+        """
+
+        # Select all needed nodes by one XPath evaluation, then dispatch by tag
+        fields: Dict[str, etree._Element] = {}
+        author_nodes: List[etree._Element] = []
+        abstract_nodes: List[etree._Element] = []
+        for node in _ARTICLE_FIELDS(article):
+            if node.tag == "Author":
+                author_nodes.append(node)
+            elif node.tag == "AbstractText":
+                abstract_nodes.append(node)
+            else:
+                fields.setdefault(node.tag, node)
+
+        def text(tag: str) -> str:
+            return _text(fields[tag]) if tag in fields else ""
+
+        web = self.base_url + text("PMID")
+        # Chapter of a book has its own title, the whole book has only BookTitle
+        title = text("ArticleTitle") or text("BookTitle") or "No Title"
+
+        names = []
+        for author in author_nodes[:5]:
+            if (name := author.findtext("CollectiveName")):
+                names.append(name)
+            else:
+                names.append(" ".join(filter(None, (author.findtext("ForeName"),
+                                                    author.findtext("LastName")))))
+        authors = "; ".join(names) or "No Author"
+
+        # Same format as the citation on PubMed web page, e.g. "2020 Jan;12(3):45-67"
+        date = ""
+        if (pub_date := fields.get("PubDate")) is not None:
+            date = pub_date.findtext("MedlineDate") or \
+                " ".join(filter(None, (pub_date.findtext("Year"),
+                                       pub_date.findtext("Month"),
+                                       pub_date.findtext("Day"))))
+        if (volume := text("Volume")):
+            date += f";{volume}"
+        if (issue := text("Issue")):
+            date += f"({issue})"
+        if (pages := text("MedlinePgn")):
+            date += f":{pages}"
+        date = date or "No Date"
 
-            if (tag := content.find("h1", class_="heading-title")):  # type: ignore
-                title = re.sub(r"\s{2,}", "", tag.text)
+        if "BookTitle" in fields and "ArticleTitle" in fields:
+            publication = text("BookTitle")
+        else:
+            publication = text("ISOAbbreviation") or text("Title") or text("PublisherName") or "No Publication"
 
-            if (tag := content.find("span", class_="cit")):  # type: ignore
-                date = tag.text
+        paragraphs = []
+        for tag in abstract_nodes:
+            label = tag.get("Label")
+            paragraphs.append(f"{label}: {_text(tag)}" if label else _text(tag))
+        abstract = "\n".join(paragraphs) or "No Abstract"
 
-            if (tag := content.find("button", id="full-view-journal-trigger")):  # type: ignore
-                publication = re.sub(r"\s+", "", tag.text)
+        # doi in <ELocationID> is preferred, <ArticleId> is the fallback
+        doi = text("ELocationID") or text("ArticleId") or "No DOI"
 
-            if (authors := content.find_all("span", class_="authors-list-item", limit=5)):  # type: ignore
-                authors = "; ".join([
-                    author.a.text for author in authors if author.find("a")])
+        return (title, authors, date, publication, abstract, doi, web)
 
-            if (tag := content.find(class_="abstract-content selected")):  # type: ignore
-                abstract = re.sub(r"\s{2,}", "", tag.text)
+    async def getPagesInfo(self, start: int, pmids: Sequence[str]) -> None:
+        """
+        Get details of a batch of papers by one E-utilities efetch request
+        Args:
+            start: Index of the first PMID in search result
+            pmids: PMIDs to fetch, no more than EFETCH_SIZE
+        """
 
-            if (tag := content.find("a", attrs={"data-ga-action": "DOI"})):  # type: ignore
-                doi = re.sub(r"\s+", "", tag.text)
+        details: Dict[str, Tuple[str, ...]] = {}
+        try:
+            for retry in range(EFETCH_RETRY):
+                # Limit the number of concurrent requests
+                async with self.semaphore:
+                    loop = asyncio.get_running_loop()
+                    begin = loop.time()
+                    log.debug(f"Fetching PMID[{pmids[0]}] ~ PMID[{pmids[-1]}]")
+                    async with self.session.post(EFETCH_URL, data={"db": "pubmed",
+                                                                   "retmode": "xml",
+                                                                   "id": ",".join(pmids)}) as response:
+                        log.info(f"Post URL: {response.url}\nURL Status: {response.status}")
+                        # Rate limited or server error, try again later
+                        rejected = response.status == 429 or response.status >= 500
+                        if not rejected:
+                            response.raise_for_status()
+                            content = await response.read()
+                    # Hold the slot for 1 second at least, so no more than FETCH_LIMIT requests per second
+                    await asyncio.sleep(max(0, begin + 1 - loop.time()))
 
-            if link := content.find(class_="full-text-links-list"):  # type: ignore
-                web = link.a["href"]  # type: ignore
+                if not rejected:
+                    break
+                log.info(f"PMID[{pmids[0]}] ~ PMID[{pmids[-1]}] Rejected: {response.status}, retry {retry + 1}")
+                await asyncio.sleep(RETRY_DELAY * (retry + 1))
+            else:
+                response.raise_for_status()
+            root = etree.fromstring(content)
+        except Exception as e:
+            log.error(f"PMID[{pmids[0]}] ~ PMID[{pmids[-1]}] Spider Error: {e}")
+        else:
+            for article in _ARTICLES(root):
+                # MedlineCitation/PMID or BookDocument/PMID
+                details[article.findtext("*/PMID")] = self.parseArticle(article)
         finally:
-            self.result_queue.put((index,
-                                   (title, authors, date, publication, abstract, doi, web)))
+            for index, pmid in enumerate(pmids, start):
+                self.setResult(index, details.get(pmid, ("Error",) * 6 + (self.base_url + pmid,)))
 
     @AsyncFunc
-    async def getAllPapers(self, result_queue: PriorityQueue, num: int) -> None:
-        self.result_queue = result_queue
+    @spiderJob
+    async def getAllPapers(self, progress: Queue, num: int) -> None:
         num = max(num, 1)
+        self.progress = progress
+        self.results = [None] * num
 
-        if getattr(self, "session", None) is None:
-            self.session = getSession()
+        self.semaphore = asyncio.Semaphore(FETCH_LIMIT)
 
-        tasks = []
         if self.total_num == 1 and hasattr(self, "single_page_pmid"):
-            tasks.append(self.getPagesInfo(0, self.single_page_pmid))
+            pmids = [self.single_page_pmid]
         else:
-            for index, pmid in enumerate(await self.getPMIDs(num)):
-                tasks.append(self.getPagesInfo(index, pmid))
+            pmids = await self.getPMIDs(num)
 
-        await asyncio.gather(*tasks)
+        # Fetch details by batches, one request for EFETCH_SIZE papers
+        tasks = [self.getPagesInfo(start, pmids[start:start + EFETCH_SIZE])
+                 for start in range(0, len(pmids), EFETCH_SIZE)]
 
-        if hasattr(self, "session"):
-            try:
-                await self.session.close()
-            finally:
-                del self.session
+        # A failed page should not stop the others
+        for error in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(error, Exception):
+                log.error(f"PubMed Spider Error: {error}")
 
 
 if __name__ == "__main__":
@@ -196,7 +331,5 @@ if __name__ == "__main__":
                     )
 
     print(pubmed.getTotalPaperNum())
-    q = PriorityQueue(1)
-    pubmed.getAllPapers(q, 1)
-    for i in range(1):
-        print(q.get())
+    pubmed.getAllPapers(Queue(1), 1)
+    print(pubmed.results)
@@ -1,17 +1,43 @@
+import asyncio
 import logging
 from abc import ABC, abstractmethod
-from queue import PriorityQueue
-from typing import Any, Dict
+from functools import wraps
+from queue import Queue
+from types import MappingProxyType
+from typing import Any, Callable, Coroutine, Dict, List, Mapping, Optional, Sequence, TypeVar
 from aiohttp import ClientSession
 
+from getpaper.utils import AsyncFunc, getSession
+
 log = logging.getLogger("GetPaper")
 
+T = TypeVar("T")
+
+def spiderJob(func: Callable[..., Coroutine[Any, Any, T]]) -> Callable[..., Coroutine[Any, Any, T]]:
+    """A decorator for counting the running jobs of spider, _idle is set when the last job finished so closeAsync can wait for it"""
+
+    @wraps(func)
+    async def wrapped(self: "_Spider", *args, **kwargs) -> T:
+        self._jobs += 1
+        try:
+            return await func(self, *args, **kwargs)
+        finally:
+            self._jobs -= 1
+            if not self._jobs and self._idle is not None:
+                self._idle.set()
+
+    return wrapped
+
 
 class _Spider(ABC):
     base_url: str
     total_num: int
-    session: ClientSession
-    result_queue: PriorityQueue
+    _session: Optional[ClientSession] = None
+    _jobs: int = 0                          # number of running jobs that use the session
+    _idle: Optional[asyncio.Event] = None   # set when all jobs finished
+    data: Mapping[str, Any]
+    progress: Queue
+    results: List[Optional[Sequence[str]]]
 
     def __init__(self,
                  keyword: str = "",
@@ -31,8 +57,34 @@ class _Spider(ABC):
             journal: filter by published journal, default to None
             sorting: sorting result by details or match
         """
-        self.data = self.parseData(
-            keyword, start_year, end_year, author, journal, sorting)
+        # Read only, each request copies it to its own params, so that requests can run at the same time
+        self.data = MappingProxyType(self.parseData(
+            keyword, start_year, end_year, author, journal, sorting))
+
+    @property
+    def session(self) -> ClientSession:
+        """ Http session shared by all requests of this spider, created on the event loop at first use"""
+        if self._session is None or self._session.closed:
+            self._session = getSession()
+        return self._session
+
+    async def closeAsync(self, wait: bool = True) -> None:
+        """ Close the shared http session
+
+        Args:
+            wait: wait for the running jobs to finish before closing
+        """
+        while wait and self._jobs:
+            self._idle = asyncio.Event()
+            await self._idle.wait()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @AsyncFunc
+    async def close(self) -> None:
+        """ Close the shared http session immediately, block until closed"""
+        await self.closeAsync(wait = False)
 
     @abstractmethod
     def parseData(self,
@@ -56,12 +108,21 @@ class _Spider(ABC):
         pass
 
     @abstractmethod
-    def getAllPapers(self, queue: PriorityQueue, num: int) -> None:
-        """ Get all papers detail
+    def getAllPapers(self, progress: Queue, num: int) -> None:
+        """ Get all papers detail, store them in self.results by the order of search result
 
         Args:
-            queue: a priority queue for storing result and was monitored by GUI thread then feedback progress,
-                details format is [index, (title, authors, date, publication, abstract, doi, web)]
+            progress: a queue was monitored by GUI thread then feedback progress, an item is put for each paper
             num: number of papers to get
         """
         pass
+
+    def setResult(self, index: int, detail: Sequence[str]) -> None:
+        """ Save a paper's detail and report the progress
+
+        Args:
+            index: index of the paper in search result
+            detail: (title, authors, date, publication, abstract, doi, web)
+        """
+        self.results[index] = detail
+        self.progress.put(index)
@@ -4,14 +4,14 @@ import logging
 from datetime import datetime
 from functools import wraps
 from importlib import import_module
-from queue import PriorityQueue
-from threading import Thread
+from threading import Lock, Thread
+from concurrent.futures import Future
 from typing import (
     Any, Callable, Coroutine, Dict, List, Optional, Tuple, TypeVar)
 
-from aiohttp import ClientSession, CookieJar
+from aiohttp import ClientSession, CookieJar, TCPConnector
 
-from getpaper.config import CLIENT_TIMEOUT, HEADER
+from getpaper.config import CLIENT_TIMEOUT, CONNECT_LIMIT, HEADER, KEEPALIVE_TIMEOUT
 
 log = logging.getLogger("GetPaper")
 
@@ -47,26 +47,71 @@ def getNowYear() -> str:
     return str(datetime.now().year + 1)
 
 
-def getSession() -> ClientSession:
-    """Create a async Http session by aiohttp"""
+def getSession(limit: int = CONNECT_LIMIT) -> ClientSession:
+    """Create a async Http session by aiohttp
 
-    return ClientSession(headers = HEADER,
+    Args:
+        limit: max number of connections, idle connections are kept alive for reuse
+    """
+
+    connector = TCPConnector(limit = limit, keepalive_timeout = KEEPALIVE_TIMEOUT)
+    return ClientSession(connector = connector,
+                         headers = HEADER,
                          read_timeout = CLIENT_TIMEOUT,
                          cookie_jar = CookieJar(unsafe = True))
 
 
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = Lock()
+
+def getLoop() -> asyncio.AbstractEventLoop:
+    """Get the event loop running on a background thread, sessions can be reused across calls on it"""
+
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            Thread(target = _loop.run_forever, daemon = True, name = "Event_Loop").start()
+    return _loop
+
+
 T = TypeVar("T")
 
 def AsyncFunc(func: Callable[..., Coroutine[Any, Any, T]]) -> Callable[..., T]:
-    """A decorator for running the async function as a common function"""
+    """A decorator for running the async function as a common function, block until it finish"""
 
     @wraps(func)
     def wrapped(*args, **kwargs):
-        return asyncio.run(func(*args, **kwargs))
+        return asyncio.run_coroutine_threadsafe(func(*args, **kwargs), getLoop()).result()
 
     return wrapped
 
 
+def submitAsync(coro: Coroutine[Any, Any, Any], tip_set: Callable[..., Any]) -> Future:
+    """ Run a coroutine on the background event loop without blocking,
+    catch the exception like MyThread and display on GUI
+
+    Args:
+        coro: coroutine to run
+        tip_set: A function to display tip on GUI, called on the event loop thread
+    Returns:
+        future: A concurrent.futures.Future for the result of coroutine
+    """
+
+    def showException(future: Future) -> None:
+        if future.cancelled() or (e := future.exception()) is None:
+            return
+        if isinstance(e, TipException):
+            tip_set(e.tip)
+        else:
+            log.error(e)
+            tip_set("未知错误")
+
+    future = asyncio.run_coroutine_threadsafe(coro, getLoop())
+    future.add_done_callback(showException)
+    return future
+
+
 def startThread(thread_name: str = "") -> Callable[..., Callable[..., Thread]]:
     """A decorator for running app function in new thread, name for debug"""
 
@@ -96,6 +141,10 @@ def setSpider(func: Callable[..., Any]) -> Callable[..., None]:
         if not self.engine.get():
             self.tip.setTip("未选择搜索引擎")
             return
+        if getattr(self, "spider", None) is not None:
+            # release the connections of previous spider after its jobs finished, don't block GUI
+            submitAsync(self.spider.closeAsync(),
+                        lambda tip: self.after(0, self.tip.setTip, tip))
         self.spider = getSpider(name = self.engine.get(),
                                 keyword = self.keyword.get(),
                                 start_year = self.start_year.get(),
@@ -109,21 +158,6 @@ def setSpider(func: Callable[..., Any]) -> Callable[..., None]:
     return wrapped
 
 
-def getQueueData(queue: PriorityQueue) -> List[List[str]]:
-    """Extract data from queue
-
-    Args:
-        queue: result queue
-    Returns:
-        returns: list of data in queue
-    """
-    result = []
-    while not queue.empty():
-        index, data = queue.get()
-        result.append(data)
-    return result
-
-
 class MyThread(Thread):
     _target: Callable
     _args: Tuple